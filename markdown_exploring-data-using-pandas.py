@@ -40,17 +40,47 @@
 # 
 # ## Reading a data file with pandas
 # 
-# Now we're ready to read in our temperature data file. First, we need to import the pandas module. It is customary to import pandas as `pd`:
+# Now we're ready to read in our temperature data file. First, we need to import the pandas module. It is customary to import pandas as `pd`. We will also import NumPy as `np`, which we will use later on for creating arrays with a specific data type:
 
 # %%
+import numpy as np
 import pandas as pd
 
+# Show at most 10 rows and 8 columns when displaying a DataFrame
+pd.set_option("display.max_rows", 10)
+pd.set_option("display.max_columns", 8)
+
 # %% [markdown]
 # Next, we'll read the input data file, and store the contents of that file in a variable called `data` Using the `pandas.read_csv()` function:
 
 # %%
-# Read the file using pandas
-data = pd.read_csv("Kumpula-June-2016-w-metadata.txt", sep=",")
+# Temperatures fit in 32 bits, half the size of the default. Giving the types
+# up front also saves pandas from inferring them for each column. The YYYYMMDD
+# dates in YEARMODA are parsed into datetime values with `parse_dates` instead.
+DTYPES = {"TEMP": np.float32, "MAX": np.float32, "MIN": np.float32}
+
+# Read the file using pandas. The pyarrow engine parses the file in parallel
+# threads, so use it when pyarrow is installed and fall back to the C engine.
+try:
+    import pyarrow  # noqa: F401
+
+    # The pyarrow engine ignores `skiprows` when the header is inferred,
+    # so point `header` at the line with the column names instead
+    read_options = {"engine": "pyarrow", "header": 8}
+except ImportError:
+    # memory_map lets the C engine parse straight from the OS page cache,
+    # which pays off when the file is read again during the session
+    read_options = {"engine": "c", "skiprows": 8, "low_memory": False, "memory_map": True}
+
+data = pd.read_csv(
+    "Kumpula-June-2016-w-metadata.txt",
+    sep=",",
+    usecols=["YEARMODA", "TEMP", "MAX", "MIN"],
+    dtype=DTYPES,
+    parse_dates=["YEARMODA"],
+    date_format="%Y%m%d",
+    **read_options,
+)
 
 # %% [markdown]
 # #### Delimiter and other optional parameters
@@ -73,20 +103,20 @@ data = pd.read_csv("Kumpula-June-2016-w-metadata.txt", sep=",")
 # %% [markdown]
 # If all goes as planned, you should now have a new variable `data` in memory that contains the input data. 
 # 
-# Let's check the the contents of this variable by calling `data` or `print(data)`:
+# Let's check the contents of this variable by calling `data` or `print(data)`. As we limited the display to 10 rows when importing pandas, only the first and last rows are shown, together with the size of the DataFrame:
 
 # %%
 data
 
 # %% [markdown]
-# This looks OK, but there are some strange values present such as `NaN`, and the first lines of the dataframe look a bit weird.
+# This looks OK: we have 30 rows and 4 columns of data, and the first rows contain the values we expected. Note, however, that we did not read the file using only the default options.
 # 
-# `NaN` stands for "not a number", and might indicate some problem with reading in the contents of the file. Plus, we expected about 30 lines of data, but the index values go up to 36 when we print the contents of the `data` variable. Looks like we need to investigate this further.
+# Without the `skiprows` (or `header`) option, pandas would try to read the first lines of the file as data. We would then see some strange values such as `NaN` ("not a number"), and the index values would go up to 36 instead of 29.
 
 # %% [markdown]
-# As we can observe, there are some metadata at the top of the file giving basic information about its contents and source. This isn't data we want to process, so we need to skip over that part of the file when we load it.
+# The file itself starts with some metadata lines giving basic information about its contents and source. This isn't data we want to process, so `pd.read_csv()` needs to skip over that part of the file when we load it.
 # 
-# Here are the 8 first rows of data in the text file (note that the 8th row is blank):
+# Here are the 8 first rows of the text file (note that the 8th row is blank):
 
 # %% [markdown]
 # ```
@@ -103,10 +133,7 @@ data
 # %% [markdown]
 # Fortunately, skipping over rows is easy to do when reading in data using pandas. We just need to add the `skiprows` parameter when we read the file, listing the number of rows to skip (8 in this case).
 # 
-# Let's try reading the datafile again, and this time defining the `skiprows` parameter.
-
-# %% [markdown]
-# Let's now print the dataframe and see what changed:
+# The faster `pyarrow` engine expects the same information a bit differently: `header=8` tells it that the column names are on the row with index 8 (the 9th line of the file), and everything above it is skipped.
 
 # %% [markdown]
 # After reading in the data, it is always good to check that everything went well by printing out the data as we did here. However, often it is enough to have a look at the top few rows of the data. 
@@ -143,12 +170,12 @@ type(data)
 # %% [markdown]
 # #### Check your understanding
 # 
-# Read the file `Kumpula-June-2016-w-metadata.txt` in again and store its contents in a new variable called `temp_data`. In this case you should only read in the columns `YEARMODA` and `TEMP`, so the new variable `temp_data` should have 30 rows and 2 columns. You can achieve this using the `usecols` parameter when reading in the file. Feel free to check for more help in the [pandas.read_csv documentation](https://pandas.pydata.org/pandas-docs/stable/generated/pandas.read_csv.html).
+# Create a new variable called `temp_data` that only contains the columns `YEARMODA` and `TEMP`, so the new variable `temp_data` should have 30 rows and 2 columns. One option would be to read the file `Kumpula-June-2016-w-metadata.txt` in again using the `usecols` parameter (see the [pandas.read_csv documentation](https://pandas.pydata.org/pandas-docs/stable/generated/pandas.read_csv.html)). However, we already have all of the data in memory, so it is faster to select the two columns from `data` using a list of column names. We will learn more about selecting columns below.
 
 # %%
 # Type in your solution below
-temp_data = pd.read_csv("Kumpula-June-2016-w-metadata.txt", sep=",", skiprows=8, usecols=["YEARMODA","TEMP"])
-temp_data
+temp_data = data[["YEARMODA","TEMP"]]
+temp_data.head(3)
 
 # %% [markdown]
 # ## DataFrame properties
@@ -157,14 +184,14 @@ temp_data
 # A normal first step when you load new data is to explore the dataset a bit to understand how the data is structured, and what kind of values are stored in there.
 
 # %% [markdown]
-# Let's start by checking the size of our data frame. We can use the `len()` function similar to the one we use with lists to check how many rows we have:
+# Let's start by checking the size of our data frame. We could use the `len()` function similar to the one we use with lists (`len(data)`), but the number of rows is also available directly as the first value of the DataFrame's `shape`:
 
 # %%
 # Check the number of rows
-len(data)
+data.shape[0]
 
 # %% [markdown]
-# We can also get a quick sense of the size of the dataset using the `shape` attribute.
+# The full `shape` attribute gives both the number of rows and the number of columns:
 # 
 
 # %%
@@ -182,7 +209,7 @@ data.shape
 
 # %%
 # Print column names
-type(data.columns.to_list())
+type(data.columns)
 
 # %% [markdown]
 # We can also find information about the row identifiers using the `index` attribute:
@@ -202,7 +229,13 @@ data.index
 data.dtypes
 
 # %% [markdown]
-# Here we see that `YEARMODA` is an integer value (with 64-bit precision; `int64`), while the other values are all decimal values with 64-bit precision (`float64`).
+# Here we see that `YEARMODA` is a date and time value (`datetime64`), while the other values are all decimal values with 32-bit precision (`float32`). By default pandas would read `YEARMODA` as an integer value (`int64`) and the other columns as decimal values with 64-bit precision (`float64`). We asked for the decimal values to be stored with 32-bit precision using the `dtype` parameter when reading the file, as daily temperatures fit comfortably in 32 bits and the smaller type uses half the memory. The `parse_dates` parameter converted the `YEARMODA` values to dates, with `date_format` describing how the dates are written in the file (year, month and day: `%Y%m%d`). We will learn more about working with dates in later lessons.
+# 
+# We can check how many bytes each column uses with `memory_usage()`:
+
+# %%
+# Print memory usage of each column (in bytes)
+data.memory_usage(deep=True)
 
 # %% [markdown]
 # #### Check your understanding
@@ -214,7 +247,8 @@ data.dtypes
 data.columns
 
 # %%
-len(data.columns)
+# The second value of the shape is the number of columns
+data.shape[1]
 
 # %% [markdown]
 # ## Selecting columns
@@ -222,35 +256,39 @@ len(data.columns)
 # We can select specific columns based on the column values. The basic syntax is `dataframe[value]`, where value can be a single column name, or a list of column names. Let's start by selecting two columns, `'YEARMODA'` and `'TEMP'`:
 
 # %%
-temp_data[["YEARMODA","TEMP"]]
+# Keep the selection in a variable so we can reuse it below
+selection = temp_data[["YEARMODA","TEMP"]]
+selection.head(3)
 
 # %% [markdown]
 # Let's also check the data type of this selection:
 
 # %%
-type(temp_data[["YEARMODA","TEMP"]])
+type(selection)
 
 # %% [markdown]
 # The subset is still a pandas DataFrame, and we are able to use all the methods and attributes related to a pandas DataFrame also with this subset. For example, we can check the shape:
 
 # %%
-
+selection.shape
 
 # %% [markdown]
 # We can also access a single column of the data based on the column name:
 
 # %%
-temp_data[["YEARMODA","TEMP"]]["TEMP"]
+# Keep the column in a variable so we can reuse it below
+temp = temp_data["TEMP"]
+temp.head(3)
 
 # %% [markdown]
 # What about the type of the column itself?
 
 # %%
 # Check datatype of the column
-temp_data.TEMP
+type(temp)
 
 # %%
-temp_data.YEARMODA
+temp_data["YEARMODA"]
 
 # %% [markdown]
 # Each column (and each row) in a pandas data frame is actually a pandas Series - a one-dimensional data structure!
@@ -274,27 +312,28 @@ temp_data.YEARMODA
 
 # %%
 # Check mean value of a column
-temp_data.mean()
+temp.mean()
 
 # %% [markdown]
 # and for all columns (in the *DataFrame*):
 
 # %%
 # Check mean value for all columns
-temp_data.TEMP.mean()
+temp_data.mean()
 
 # %% [markdown]
-# For an overview of the basic statistics for all attributes in the data, we can use the `describe()` method:
+# For an overview of the basic statistics for all attributes in the data, we can use the `agg()` method. It takes a list of statistics and collects the results for each column into a single table, so we don't need to call `mean()`, `median()`, `min()` and the other methods one at a time. The `describe()` method gives a similar overview with a fixed set of statistics.
 # 
 
 # %%
 # Get descriptive statistics
-temp_data.describe()
+stats = data.agg(["mean","median","min","max","std","count"])
+stats
 
 # %% [markdown]
 # #### Check your understanding
 # 
-# It doesn't make much sense to print out descriptive statistics for the `YEARMODA` column now that the values are stored as integer values (and not datetime objects, which we will learn about in later lessons). 
+# The `YEARMODA` column contains dates, so the descriptive statistics for it are not very useful (we will learn more about datetime objects in later lessons). 
 # 
 # See if you can print out the descriptive statistics again, this time only for columns `TEMP`, `MAX`, `MIN`:
 
@@ -303,19 +342,104 @@ temp_data.dtypes
 
 # %%
 # Type in your solution below
-temp_data.describe(exclude=["int64"])
+data[["TEMP","MAX","MIN"]].describe()
+
+# %% [markdown]
+# ## Statistics for large data files (*optional*)
+# 
+# Our sample file has only 30 rows, but NOAA data files can easily contain millions of rows. Reading such a file into a single DataFrame may take a lot of memory. Instead, we can read the file in pieces using the `chunksize` parameter of `pd.read_csv()`. pandas then gives us one DataFrame of at most `chunksize` rows at a time, and we can update running statistics for each column as we go. This way only one chunk needs to be in memory at a time.
+# 
+# For the standard deviation we keep the mean and the sum of squared deviations from the mean, and combine the values of each new chunk with the ones we have so far ([Chan et al.'s parallel algorithm](https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm)). The shorter textbook formula based on the sum of squared values can lose most of its precision when there are many values.
+# 
+# **Note**: The `pyarrow` engine does not support `chunksize`, so here we use the default C engine and the `skiprows` parameter.
+
+# %%
+# Running statistics for each column, updated one chunk at a time
+chunk_columns = ["TEMP", "MAX", "MIN"]
+chunk_count = pd.Series(0, index=chunk_columns)
+chunk_mean = pd.Series(0.0, index=chunk_columns)
+chunk_m2 = pd.Series(0.0, index=chunk_columns)  # Sum of squared deviations from the mean
+chunk_min = pd.Series(np.nan, index=chunk_columns)
+chunk_max = pd.Series(np.nan, index=chunk_columns)
+
+chunk_reader = pd.read_csv(
+    "Kumpula-June-2016-w-metadata.txt",
+    sep=",",
+    skiprows=8,
+    usecols=chunk_columns,
+    dtype={column: DTYPES[column] for column in chunk_columns},
+    chunksize=1_000_000,
+)
+with chunk_reader:
+    for chunk in chunk_reader:
+        # Compute in 64-bit precision to avoid rounding errors in long files
+        values = chunk.astype("float64")
+        new_count = values.count()
+        # Columns without any values in this chunk get a mean of 0 and no weight
+        new_mean = values.mean().fillna(0.0)
+        new_m2 = ((values - new_mean) ** 2).sum()
+
+        # Combine the chunk with the statistics so far (Chan et al.)
+        total_count = chunk_count + new_count
+        weight = (new_count / total_count).where(total_count > 0, 0.0)
+        delta = new_mean - chunk_mean
+        chunk_mean += delta * weight
+        chunk_m2 += new_m2 + delta**2 * chunk_count * weight
+        chunk_count = total_count
+
+        # fmin and fmax ignore NaN values (e.g. a chunk with no MAX values)
+        chunk_min = np.fmin(chunk_min, values.min())
+        chunk_max = np.fmax(chunk_max, values.max())
+
+chunk_std = np.sqrt(chunk_m2 / (chunk_count - 1))
+chunk_stats = pd.DataFrame(
+    {"mean": chunk_mean, "min": chunk_min, "max": chunk_max, "std": chunk_std, "count": chunk_count}
+).T
+chunk_stats
+
+# %% [markdown]
+# ## Processing data row by row (*optional*)
+# 
+# pandas is fast when we do the same operation for a whole column at once, like computing the mean. If we instead need to go through the data one row at a time (for example checking a condition on each row), creating a DataFrame does not help much: every column access in the loop adds some overhead. For such cases the built-in `csv` module is simpler and faster. Let's use it to find the days with a mean temperature above 60 °F:
+
+# %%
+import csv
+
+with open("Kumpula-June-2016-w-metadata.txt", newline="") as infile:
+    # Skip the metadata lines above the column names
+    for _ in range(8):
+        next(infile)
+    warm_days = [row["YEARMODA"] for row in csv.DictReader(infile) if float(row["TEMP"]) > 60]
+
+print(warm_days)
+
+# %% [markdown]
+# If we need the numbers as arrays but not the other features of a DataFrame, NumPy can also read the file directly. `np.genfromtxt()` fills in missing values (such as the empty `MAX` values) with `NaN`, and the `dtype` parameter gives each column a name and a data type. Here we skip the 8 metadata lines and the line with the column names:
+
+# %%
+weather = np.genfromtxt(
+    "Kumpula-June-2016-w-metadata.txt",
+    delimiter=",",
+    skip_header=9,
+    dtype=[("YEARMODA", "i4"), ("TEMP", "f4"), ("MAX", "f4"), ("MIN", "f4")],
+)
+weather["TEMP"]
 
 # %% [markdown]
 # ## Very basic plots (*optional*)
 # 
 # Visualizing the data is a key part of data exploration, and pandas comes with a handful of plotting methods, which all rely on the [Matplotlib](https://matplotlib.org/) plotting library. 
 # 
-# For very basic plots, we don’t need to import Matplotlib separately. We can already create very simple plots using the `DataFrame.plot` method. 
+# For very basic plots, we could use the `DataFrame.plot` method without importing Matplotlib separately, for example `temp_data[["TEMP"]].plot()`. However, pandas does quite a bit of extra work behind the scenes to prepare such a plot, so here we import Matplotlib ourselves and pass the values of the column directly to it. 
 # 
-# Let's plot all the columns that contain values related to temperatures:
+# Let's plot the mean daily temperatures:
 
 # %%
-temp_data[["TEMP"]].plot()
+import matplotlib.pyplot as plt
+
+fig, ax = plt.subplots()
+ax.plot(temp.to_numpy(copy=False))
+plt.show()
 
 # %% [markdown]
 # Now you might want to start modifying the plot by adding axis labels, color settings and other formatting. We will learn all this during week 7!
@@ -327,17 +451,18 @@ temp_data[["TEMP"]].plot()
 
 # %%
 # Create pandas Series from a list
-number_series = pd.Series([4, 5, 6, 7.0])
+number_series = pd.Series([4, 5, 6, 7.0], dtype="float32")
 print(number_series)
 
 # %% [markdown]
-# Note that pandas is smart about the conversion, detecting a single floating point value (`7.0`) and assigning all values in the Series the data type `float64`.
+# Note that pandas is smart about the conversion: without the `dtype` parameter, it would detect the single floating point value (`7.0`) and assign all values in the Series the data type `float64`. Here we instead tell pandas the data type up front using `dtype="float32"`, so pandas can skip checking each value and the Series needs half the memory.
 
 # %% [markdown]
 # If needed, you can also set a custom index when creating the object:
 
 # %%
-number_series = pd.Series([4, 5, 6, 7.0], index=["a", "b", "c", "d"])
+index = pd.Index(["a", "b", "c", "d"])
+number_series = pd.Series([4, 5, 6, 7.0], index=index, dtype="float32")
 print(number_series)
 
 # %%
@@ -365,7 +490,22 @@ lons = [22.95, 26.05, 24.94, 25.05]
 # Often we indeed create pandas DataFrames by reading in data (e.g. using `pd.read_csv(filename.csv)`), but sometimes you might also combine lists into a DataFrame inside the script using the `pandas.DataFrame` constructor. Here, we are using a *Python dictionary* `{"column_1": list_1, "column_2": list_2, ...}` to indicate the structure of our data. 
 
 # %%
-new_data = pd.DataFrame(data={"Station name": stations, "Latitude": lats, "Longitude": lons})
+# Convert the coordinates to NumPy arrays so pandas does not need to inspect every list item
+lats_arr = np.asarray(lats, dtype=np.float32)
+lons_arr = np.asarray(lons, dtype=np.float32)
+
+# Arrow-backed strings store all station names in one buffer instead of
+# one Python object per name; use pandas' own string type without pyarrow
+try:
+    stations_arr = pd.array(stations, dtype="string[pyarrow]")
+except ImportError:
+    stations_arr = pd.array(stations, dtype="string")
+
+# copy=False lets the DataFrame use the arrays as they are instead of copying them
+new_data = pd.DataFrame(
+    data={"Station name": stations_arr, "Latitude": lats_arr, "Longitude": lons_arr},
+    copy=False,
+)
 new_data
 
 # %%